@@ -5,7 +5,7 @@ import traceback
 import tempfile
 import inspect
 from PIL import Image
-from tools import filters
+from tools import bulk_io, filters, registry, workers
 from mcp.server.fastmcp import FastMCP
 
 # Create an MCP server
@@ -27,28 +27,64 @@ def get_writable_dir():
     # Fall back to system temp directory
     return tempfile.gettempdir()
 
+# Filters register themselves in tools/filters.py; pick up any installed plugins too
+registry.load_entry_points()
+
 # Map filter names to functions
-OPERATIONS = {
-    "grayscale": filters.apply_grayscale,
-    "sepia": filters.apply_sepia,
-    "blur": filters.apply_blur,
-    "sharpen": filters.apply_sharpen,
-    "edge_detection": filters.apply_edge_detection,
-    "invert": filters.apply_invert,
-    "emboss": filters.apply_emboss,
-    "contour": filters.apply_contour,
-    "smooth": filters.apply_smooth,
-    "solarize": filters.apply_solarize
-}
+OPERATIONS = {name: spec.func for name, spec in registry.FILTERS.items()}
 
-# Get the parameter names for each filter function
+# Get the parameter names for each filter
 FILTER_PARAMS = {}
-for op_name, op_func in OPERATIONS.items():
-    # Get the parameter names from the function signature
-    sig = inspect.signature(op_func)
-    # Skip the first parameter (img) and get the rest
-    FILTER_PARAMS[op_name] = [param for param in list(sig.parameters.keys())[1:]]
-    print(f"Filter {op_name} accepts parameters: {FILTER_PARAMS[op_name]}", file=sys.stderr)
+for op_name, spec in registry.FILTERS.items():
+    FILTER_PARAMS[op_name] = spec.param_names()
+    print(f"Filter {op_name} ({spec.kind}) accepts parameters: {FILTER_PARAMS[op_name]}", file=sys.stderr)
+
+# Extensions treated as images when choosing output names and scanning directories
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+
+# Persistent worker pool, started alongside the server in __main__
+WORKER_POOL = None
+
+# Estimated filter time above which work is handed to the worker pool; cheaper
+# calls run inline since the shared-memory handoff would cost more than it saves
+POOL_MIN_COST_NS = 20_000_000
+
+# Estimate how long a filter call would take, counting only the boxes if given
+def estimate_cost_ns(spec, img, filter_params, box=None):
+    """Estimate how long a filter call would take, counting only the boxes if given."""
+    if box:
+        regions = [(right - left, bottom - top)
+                   for left, top, right, bottom in filters.normalize_boxes(box, img.size)]
+    else:
+        regions = [img.size]
+    return sum(spec.estimate_cost_ns(width, height, **filter_params) for width, height in regions)
+
+# Apply a registered filter to an image, optionally restricted to regions of interest
+def run_filter(spec, img, filter_params, box=None):
+    """Apply a registered filter to an image, optionally restricted to regions of interest."""
+    if box:
+        margin = spec.margin(**filter_params)
+        print(f"[{spec.name}] Applying filter to {box} (margin {margin}) with params: {filter_params}", file=sys.stderr)
+        return filters.apply_filter(spec, img, box, **filter_params)
+    # A single image only gains from the pool if it is split across several workers
+    if WORKER_POOL is not None and WORKER_POOL.processes > 1:
+        cost = estimate_cost_ns(spec, img, filter_params)
+        if cost >= POOL_MIN_COST_NS:
+            print(f"[{spec.name}] Running in {WORKER_POOL.processes} strips on the worker pool (estimated {cost / 1e6:.1f} ms) with params: {filter_params}", file=sys.stderr)
+            return WORKER_POOL.apply_tiled(spec, img, filter_params)
+    print(f"[{spec.name}] Applying filter with params: {filter_params}", file=sys.stderr)
+    return filters.apply_filter(spec, img, **filter_params)
+
+# Start a filter as part of a batch
+def submit_filter(spec, img, filter_params, box=None):
+    """Start a filter as part of a batch.
+    
+    Costly calls are handed whole to the worker pool and return a Future, so several images are
+    filtered in parallel; cheap ones run inline and return the filtered image.
+    """
+    if WORKER_POOL is not None and estimate_cost_ns(spec, img, filter_params, box) >= POOL_MIN_COST_NS:
+        return WORKER_POOL.submit(spec, img, filter_params, box)
+    return run_filter(spec, img, filter_params, box)
 
 # Create a test image in the writable directory
 def create_test_image():
@@ -95,13 +131,16 @@ def map_claude_path(path):
     return path
 
 # Define a function to create a filter tool for a specific operation
-def create_filter_tool(op_name, op_func):
-    def filter_tool(image_path: str, output_path: str = None, **kwargs):
+def create_filter_tool(spec):
+    op_name = spec.name
+
+    def filter_tool(image_path: str, output_path: str = None, box: list = None, **kwargs):
         """Apply a filter to an image.
         
         Args:
             image_path: Path to the input image file
             output_path: Optional path to save the filtered image. If not provided, a default path will be used.
+            box: Optional region (left, top, right, bottom), or list of regions, to restrict the filter to.
         """
         print(f"[{op_name}] Called with image_path: '{image_path}', output_path: '{output_path}'", file=sys.stderr)
         print(f"[{op_name}] Additional kwargs: {kwargs}", file=sys.stderr)
@@ -167,14 +206,8 @@ def create_filter_tool(op_name, op_func):
         
         try:
             # Extract only the parameters that this filter accepts
-            accepted_params = FILTER_PARAMS.get(op_name, [])
-            filter_params = {}
-            for param in accepted_params:
-                if param in kwargs:
-                    filter_params[param] = kwargs[param]
-            
-            print(f"[{op_name}] Applying filter with params: {filter_params}", file=sys.stderr)
-            result_img = op_func(img, **filter_params)
+            filter_params = spec.bind(kwargs)
+            result_img = run_filter(spec, img, filter_params, box)
             print(f"[{op_name}] Filter applied successfully", file=sys.stderr)
         except Exception as e:
             print(f"[{op_name}] Error processing image: {e}", file=sys.stderr)
@@ -205,12 +238,12 @@ def create_filter_tool(op_name, op_func):
                 # Generate a unique filename
                 base_name = os.path.basename(image_path)
                 name, ext = os.path.splitext(base_name)
-                if not ext or ext.lower() not in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
+                if not ext or ext.lower() not in IMAGE_EXTENSIONS:
                     ext = '.jpg'  # Default to jpg if no valid extension
                 output_path = os.path.join(writable_dir, f"{name}_{op_name}{ext}")
                 
             print(f"[{op_name}] Saving image to: '{output_path}'", file=sys.stderr)
-            result_img.save(output_path)
+            bulk_io.save_atomic(result_img, output_path)
             print(f"[{op_name}] Image saved successfully", file=sys.stderr)
         except Exception as e:
             print(f"[{op_name}] Error saving image: {e}", file=sys.stderr)
@@ -222,7 +255,7 @@ def create_filter_tool(op_name, op_func):
                 temp_file.close()
                 output_path = temp_file.name
                 print(f"[{op_name}] Trying to save to temp file: '{output_path}'", file=sys.stderr)
-                result_img.save(output_path)
+                filters.drop_alpha_for(result_img, output_path).save(output_path)
                 print(f"[{op_name}] Successfully saved to temp file", file=sys.stderr)
             except Exception as e2:
                 print(f"[{op_name}] Error saving to temp file: {e2}", file=sys.stderr)
@@ -230,23 +263,32 @@ def create_filter_tool(op_name, op_func):
         
         return f"Filter '{op_name}' applied successfully. Image saved to {output_path}"
     
-    # Set the function name and docstring
+    # Set the function name, signature and docstring
     filter_tool.__name__ = op_name
     
+    # Expose the declared filter parameters as real arguments so they show up in the tool schema
+    base_params = [param for param in inspect.signature(filter_tool).parameters.values()
+                   if param.kind != inspect.Parameter.VAR_KEYWORD]
+    filter_tool.__signature__ = inspect.Signature(base_params + [
+        inspect.Parameter(param.name, inspect.Parameter.KEYWORD_ONLY, default=param.default, annotation=param.type)
+        for param in spec.params
+    ])
+    
     # Create a detailed docstring based on the filter's parameters
     param_docs = []
-    for param in FILTER_PARAMS.get(op_name, []):
-        param_docs.append(f"        {param}: Parameter for the {op_name} filter")
+    for param in spec.params:
+        param_docs.append(f"        {param.name}: {param.description} ({param.type.__name__}, default {param.default!r})")
     
     param_doc_str = "\n".join(param_docs)
     if param_doc_str:
         param_doc_str = "\n" + param_doc_str
     
-    filter_tool.__doc__ = f"""Apply {op_name} filter to an image.
+    filter_tool.__doc__ = f"""{spec.description or f"Apply {op_name} filter to an image."}
     
     Args:
         image_path: Path to the input image file. Can be absolute or relative.
-        output_path: Optional path to save the filtered image. If not provided, a default path will be used.{param_doc_str}
+        output_path: Optional path to save the filtered image. If not provided, a default path will be used.
+        box: Optional region [left, top, right, bottom], or list of regions, to apply the filter to. The rest of the image is left untouched.{param_doc_str}
     
     Returns:
         A message indicating the filter was applied successfully and where the output was saved.
@@ -255,10 +297,73 @@ def create_filter_tool(op_name, op_func):
     return filter_tool
 
 # Register all filter tools
-for op_name, op_func in OPERATIONS.items():
-    tool_func = create_filter_tool(op_name, op_func)
+for op_name, spec in registry.FILTERS.items():
+    tool_func = create_filter_tool(spec)
     mcp.tool(name=op_name)(tool_func)
 
+# Apply one filter to many images, overlapping disk I/O with filtering
+@mcp.tool(name="batch_filter")
+def batch_filter(filter_name: str, image_paths: list = None, input_dir: str = None, output_dir: str = None,
+                 params: dict = None, box: list = None):
+    """Apply a filter to many images at once.
+    
+    Upcoming input files are read ahead in the background and outputs are written by a separate
+    writer pool, so storage latency overlaps with filtering instead of adding up per file.
+    
+    Args:
+        filter_name: Name of the filter to apply, e.g. "blur" or "sepia".
+        image_paths: Optional list of input image files.
+        input_dir: Optional directory; every image file directly inside it is processed.
+        output_dir: Optional directory for the filtered images. If not provided, a default directory will be used.
+        params: Optional filter parameters, e.g. {"radius": 5.0} for blur.
+        box: Optional region [left, top, right, bottom], or list of regions, to apply the filter to.
+    
+    Returns:
+        A summary of how many images were filtered, where they were saved, and any failures.
+    """
+    spec = registry.FILTERS.get(filter_name)
+    if spec is None:
+        raise ValueError(f"Unknown filter '{filter_name}'. Available filters: {list(registry.FILTERS)}")
+    
+    paths = [os.path.abspath(os.path.expanduser(path)) for path in image_paths or []]
+    if input_dir:
+        input_dir = os.path.abspath(os.path.expanduser(input_dir))
+        for entry in sorted(os.listdir(input_dir)):
+            if os.path.splitext(entry)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(input_dir, entry))
+    if not paths:
+        raise ValueError("No input images: provide image_paths or an input_dir containing images")
+    
+    writable_dir = get_writable_dir()
+    if output_dir:
+        output_dir = os.path.expanduser(output_dir)
+        if not os.path.isabs(output_dir):
+            output_dir = os.path.join(writable_dir, output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+    else:
+        output_dir = writable_dir
+    
+    def output_path_for(path):
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            ext = '.jpg'
+        return os.path.join(output_dir, f"{name}_{filter_name}{ext}")
+    
+    filter_params = spec.bind(params or {})
+    print(f"[batch_filter] Applying {filter_name} to {len(paths)} images, saving to '{output_dir}'", file=sys.stderr)
+    # Keep one image in flight per worker so the whole pool shares the batch
+    max_in_flight = WORKER_POOL.processes if WORKER_POOL is not None else 1
+    results = bulk_io.process_files(paths, lambda img: submit_filter(spec, img, filter_params, box), output_path_for,
+                                    max_in_flight=max_in_flight)
+    
+    failures = [f"{path}: {error}" for path, _, error in results if error is not None]
+    for failure in failures:
+        print(f"[batch_filter] Failed: {failure}", file=sys.stderr)
+    summary = f"Filter '{filter_name}' applied to {len(results) - len(failures)} of {len(results)} images. Outputs saved to {output_dir}"
+    if failures:
+        summary += "\nFailed:\n" + "\n".join(failures)
+    return summary
+
 if __name__ == "__main__":
     print("Starting Image Filter MCP Server...", file=sys.stderr)
     print(f"Current working directory: {os.getcwd()}", file=sys.stderr)
@@ -269,6 +374,10 @@ if __name__ == "__main__":
     test_image_path = create_test_image()
     print(f"Created test image at: {test_image_path}", file=sys.stderr)
     
+    # Start the worker pool before serving so the first large request does not pay for it
+    WORKER_POOL = workers.WorkerPool()
+    print(f"Started {WORKER_POOL.processes} filter worker processes", file=sys.stderr)
+    
     # Check if we can access the home directory
     try:
         home_dir = os.path.expanduser("~")
@@ -277,4 +386,7 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Error accessing home directory: {e}", file=sys.stderr)
     
-    mcp.run(transport='stdio')
+    try:
+        mcp.run(transport='stdio')
+    finally:
+        WORKER_POOL.close()
@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# Add the parent directory to the path so we can import the tools package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools import bulk_io, filters
+
+class TestBulkIO(unittest.TestCase):
+    """Test cases for the bulk I/O helpers."""
+    
+    def setUp(self):
+        """Create a directory with a few test images."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir = self.tmp_dir.name
+        self.paths = []
+        for i in range(5):
+            path = os.path.join(self.dir, f"image_{i}.png")
+            Image.new('RGB', (20, 20), color=(i * 50, 0, 0)).save(path)
+            self.paths.append(path)
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+    
+    def test_save_atomic(self):
+        """Test that save_atomic writes the image and leaves no temporary files."""
+        path = os.path.join(self.dir, 'out.png')
+        bulk_io.save_atomic(Image.new('RGB', (10, 10), color='blue'), path)
+        self.assertEqual(Image.open(path).getpixel((5, 5)), (0, 0, 255))
+        self.assertFalse([name for name in os.listdir(self.dir) if name.startswith('.')])
+    
+    def test_save_atomic_failure_cleans_up(self):
+        """Test that a failed save removes its temporary file and writes nothing."""
+        path = os.path.join(self.dir, 'out.unknown')
+        with self.assertRaises(ValueError):
+            bulk_io.save_atomic(Image.new('RGB', (10, 10)), path)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse([name for name in os.listdir(self.dir) if name.startswith('.')])
+    
+    def test_save_atomic_drops_alpha_for_jpeg(self):
+        """Test that RGBA filter output can be saved as JPEG."""
+        rgba = Image.new('RGBA', (10, 10), color=(200, 0, 0, 128))
+        path = os.path.join(self.dir, 'out.jpg')
+        bulk_io.save_atomic(filters.apply_grayscale(rgba), path)
+        self.assertEqual(Image.open(path).mode, 'RGB')
+        png_path = os.path.join(self.dir, 'out.png')
+        bulk_io.save_atomic(filters.apply_grayscale(rgba), png_path)
+        self.assertEqual(Image.open(png_path).mode, 'RGBA')
+    
+    def test_read_ahead_preserves_order(self):
+        """Test that read-ahead yields files in input order with their contents."""
+        results = list(bulk_io.read_ahead(self.paths, window=2))
+        self.assertEqual([path for path, _ in results], self.paths)
+        img = bulk_io.decode(results[3][1].result())
+        self.assertEqual(img.getpixel((0, 0)), (150, 0, 0))
+    
+    def test_process_files(self):
+        """Test the full read, filter and write pipeline, including a bad input."""
+        bad_path = os.path.join(self.dir, 'bad.png')
+        with open(bad_path, 'w') as f:
+            f.write('not an image')
+        out_dir = os.path.join(self.dir, 'out')
+        os.makedirs(out_dir)
+        results = bulk_io.process_files(
+            self.paths + [bad_path], filters.apply_invert,
+            lambda path: os.path.join(out_dir, os.path.basename(path)), window=2)
+        self.assertEqual([path for path, _, _ in results], self.paths + [bad_path])
+        self.assertIsNotNone(results[-1][2])
+        for path, output_path, error in results[:-1]:
+            self.assertIsNone(error)
+            self.assertEqual(Image.open(output_path).getpixel((0, 0)),
+                             filters.apply_invert(Image.open(path)).getpixel((0, 0)))
+
+    def test_process_files_duplicate_names(self):
+        """Test that inputs with the same file name do not overwrite each other."""
+        other_dir = os.path.join(self.dir, 'other')
+        os.makedirs(other_dir)
+        other_path = os.path.join(other_dir, 'image_0.png')
+        Image.new('RGB', (20, 20), color='green').save(other_path)
+        out_dir = os.path.join(self.dir, 'out')
+        os.makedirs(out_dir)
+        results = bulk_io.process_files(
+            [self.paths[0], other_path], filters.apply_invert,
+            lambda path: os.path.join(out_dir, os.path.basename(path)))
+        output_paths = [output_path for _, output_path, _ in results]
+        self.assertEqual(len(set(output_paths)), 2)
+        self.assertEqual(sorted(os.listdir(out_dir)), ['image_0.png', 'image_0_1.png'])
+        self.assertEqual(Image.open(output_paths[1]).getpixel((0, 0)), (255, 127, 255))
+
+    def test_process_files_with_futures(self):
+        """Test that func may return Futures, kept in flight up to max_in_flight."""
+        out_dir = os.path.join(self.dir, 'out')
+        os.makedirs(out_dir)
+        bad_path = os.path.join(self.dir, 'bad.png')
+        with open(bad_path, 'w') as f:
+            f.write('not an image')
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = bulk_io.process_files(
+                [self.paths[0], bad_path] + self.paths[1:],
+                lambda img: executor.submit(filters.apply_invert, img),
+                lambda path: os.path.join(out_dir, os.path.basename(path)), max_in_flight=3)
+        self.assertEqual([path for path, _, _ in results], [self.paths[0], bad_path] + self.paths[1:])
+        self.assertIsNotNone(results[1][2])
+        self.assertEqual(len(os.listdir(out_dir)), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ from PIL import Image
 # Add the parent directory to the path so we can import the tools package
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from tools import filters
+from tools import filters, registry
 
 class TestFilters(unittest.TestCase):
     """Test cases for image filters."""
@@ -81,5 +81,146 @@ class TestFilters(unittest.TestCase):
         r, g, b = result.getpixel((50, 50))
         self.assertEqual(r, 0)
 
+    def test_grayscale_keep_mode(self):
+        """Test that keep_mode returns a single-band image."""
+        gray = Image.new('L', (100, 100), color=80)
+        result = filters.apply_grayscale(gray, keep_mode=True)
+        self.assertEqual(result.mode, 'L')
+        self.assertEqual(result.getpixel((50, 50)), 80)
+        result = filters.apply_grayscale(self.test_image, keep_mode=True)
+        self.assertEqual(result.mode, 'L')
+    
+    def test_grayscale_grayscale_input(self):
+        """Test that grayscale input is promoted straight to RGB."""
+        gray = Image.new('L', (100, 100), color=80)
+        result = filters.apply_grayscale(gray)
+        self.assertEqual(result.mode, 'RGB')
+        self.assertEqual(result.getpixel((50, 50)), (80, 80, 80))
+    
+    def test_sepia_grayscale_input(self):
+        """Test the sepia filter on a grayscale image."""
+        gray = Image.new('L', (100, 100), color=100)
+        result = filters.apply_sepia(gray)
+        self.assertEqual(result.mode, 'RGB')
+        r, g, b = result.getpixel((50, 50))
+        self.assertGreater(r, g)
+        self.assertGreater(g, b)
+    
+    def test_invert_keep_mode(self):
+        """Test that invert can stay in grayscale mode."""
+        gray = Image.new('L', (100, 100), color=0)
+        self.assertEqual(filters.apply_invert(gray).mode, 'RGB')
+        result = filters.apply_invert(gray, keep_mode=True)
+        self.assertEqual(result.mode, 'L')
+        self.assertEqual(result.getpixel((50, 50)), 255)
+    
+    def test_alpha_preserved(self):
+        """Test that filters leave the alpha channel untouched."""
+        rgba = Image.new('RGBA', (100, 100), color=(255, 0, 0, 0))
+        rgba.paste((0, 0, 255, 255), (25, 25, 75, 75))
+        for op in (filters.apply_grayscale, filters.apply_sepia, filters.apply_invert,
+                   filters.apply_blur, filters.apply_sharpen, filters.apply_solarize):
+            result = op(rgba)
+            self.assertEqual(result.mode, 'RGBA')
+            self.assertEqual(result.getchannel('A').tobytes(), rgba.getchannel('A').tobytes())
+        # Invert only touches the colour bands
+        self.assertEqual(filters.apply_invert(rgba).getpixel((50, 50)), (255, 255, 0, 255))
+    
+    def test_palette_input(self):
+        """Test that palette images are converted before filtering."""
+        palette = self.test_image.convert('P')
+        self.assertEqual(filters.apply_emboss(palette).mode, 'RGB')
+        self.assertEqual(filters.apply_invert(palette).mode, 'RGB')
+
+    def test_drop_alpha_for(self):
+        """Test that alpha is dropped only for formats that cannot store it."""
+        rgba = filters.apply_grayscale(Image.new('RGBA', (10, 10), color=(200, 0, 0, 128)))
+        self.assertEqual(filters.drop_alpha_for(rgba, 'out.jpg').mode, 'RGB')
+        self.assertEqual(filters.drop_alpha_for(rgba, 'out.png').mode, 'RGBA')
+        la = Image.new('LA', (10, 10))
+        self.assertEqual(filters.drop_alpha_for(la, 'out.JPEG').mode, 'L')
+
+    def test_apply_to_boxes(self):
+        """Test that only the requested region is filtered."""
+        result = filters.apply_to_boxes(self.test_image, filters.apply_invert, [10, 10, 30, 30])
+        self.assertEqual(result.getpixel((20, 20)), (0, 255, 255))
+        self.assertEqual(result.getpixel((50, 50)), (255, 0, 0))
+    
+    def test_apply_to_boxes_matches_full_frame(self):
+        """Test that a convolution inside a box matches filtering the whole image."""
+        gradient = Image.linear_gradient('L').resize((100, 100)).convert('RGB')
+        box = (20, 20, 60, 60)
+        full = filters.apply_blur(gradient, radius=2.0)
+        roi = filters.apply_to_boxes(gradient, filters.apply_blur, [box], margin=6, radius=2.0)
+        self.assertEqual(roi.crop(box).tobytes(), full.crop(box).tobytes())
+        self.assertEqual(roi.getpixel((80, 80)), gradient.getpixel((80, 80)))
+    
+    def test_apply_to_boxes_small_blur_radius(self):
+        """Test that a small blur radius inside a box still matches the whole-image result."""
+        noise = Image.effect_noise((100, 100), 64).convert('RGB')
+        box = (20, 20, 60, 60)
+        for radius in (0.2, 0.4, 0.6):
+            full = filters.apply_blur(noise, radius=radius)
+            margin = registry.FILTERS['blur'].margin(radius=radius)
+            roi = filters.apply_to_boxes(noise, filters.apply_blur, [box], margin=margin, radius=radius)
+            self.assertEqual(roi.crop(box).tobytes(), full.crop(box).tobytes())
+    
+    def test_apply_to_boxes_overlapping(self):
+        """Test that overlapping boxes are not filtered twice."""
+        boxes = [[0, 0, 60, 60], [40, 40, 100, 100]]
+        result = filters.apply_to_boxes(self.test_image, filters.apply_invert, boxes)
+        self.assertEqual(result.getpixel((50, 50)), (0, 255, 255))
+        self.assertEqual(result.getpixel((90, 10)), (255, 0, 0))
+    
+    def test_apply_to_boxes_keeps_outside_pixels(self):
+        """Test that a filter returning a narrower mode leaves pixels outside the box unchanged."""
+        result = filters.apply_to_boxes(self.test_image, filters.apply_grayscale, [10, 10, 20, 20], keep_mode=True)
+        self.assertEqual(result.mode, 'RGB')
+        self.assertEqual(result.getpixel((50, 50)), (255, 0, 0))
+        self.assertEqual(result.getpixel((15, 15)), (76, 76, 76))
+        rgba = Image.new('RGBA', (100, 100), color=(255, 0, 0, 200))
+        result = filters.apply_to_boxes(rgba, filters.apply_grayscale, [10, 10, 20, 20], keep_mode=True)
+        self.assertEqual(result.mode, 'RGBA')
+        self.assertEqual(result.getpixel((50, 50)), (255, 0, 0, 200))
+        self.assertEqual(result.getpixel((15, 15)), (76, 76, 76, 200))
+    
+    def test_apply_to_boxes_widens_mode(self):
+        """Test that a filter returning a wider mode widens the base image losslessly."""
+        gray = Image.new('L', (100, 100), color=100)
+        result = filters.apply_to_boxes(gray, filters.apply_sepia, [10, 10, 20, 20])
+        self.assertEqual(result.mode, 'RGB')
+        self.assertEqual(result.getpixel((50, 50)), (100, 100, 100))
+        self.assertEqual(result.getpixel((15, 15)), filters.apply_sepia(gray).getpixel((15, 15)))
+    
+    def test_apply_to_boxes_invalid(self):
+        """Test that boxes outside the image are rejected."""
+        with self.assertRaises(ValueError):
+            filters.apply_to_boxes(self.test_image, filters.apply_invert, [200, 200, 300, 300])
+
+    def test_convert_for(self):
+        """Test that images are converted to a declared mode, widening losslessly when possible."""
+        gray = Image.new('L', (10, 10), color=100)
+        self.assertIs(filters.convert_for(gray, ('L', 'RGB')), gray)
+        self.assertEqual(filters.convert_for(gray, ('RGBA', 'RGB')).mode, 'RGBA')
+        self.assertEqual(filters.convert_for(self.test_image.convert('RGBA'), ('RGB', 'L')).mode, 'RGB')
+        self.assertEqual(filters.convert_for(self.test_image.convert('P'), ('L',)).mode, 'L')
+
+    def test_apply_filter_uses_declared_modes(self):
+        """Test that a filter only ever sees the modes it declares."""
+        seen = []
+        def rgb_only(img):
+            seen.append(img.mode)
+            return img.point(lambda v: 255 - v)
+        spec = registry.FilterSpec('rgb_only', rgb_only, modes=('RGB',))
+        rgba = self.test_image.convert('RGBA')
+        rgba.putalpha(100)
+        self.assertEqual(filters.apply_filter(spec, rgba).mode, 'RGB')
+        # With a box only the region is converted, so alpha outside it survives
+        result = filters.apply_filter(spec, rgba, [10, 10, 20, 20])
+        self.assertEqual(seen, ['RGB', 'RGB'])
+        self.assertEqual(result.mode, 'RGBA')
+        self.assertEqual(result.getpixel((50, 50)), (255, 0, 0, 100))
+        self.assertEqual(result.getpixel((15, 15)), (0, 255, 255, 255))
+
 if __name__ == '__main__':
     unittest.main()
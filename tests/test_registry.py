@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+from PIL import Image
+
+# Add the parent directory to the path so we can import the tools package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools import filters, registry
+
+class TestRegistry(unittest.TestCase):
+    """Test cases for the filter registry."""
+    
+    def test_builtin_filters_registered(self):
+        """Test that every built-in filter is registered with its function."""
+        self.assertEqual(registry.FILTERS['blur'].func, filters.apply_blur)
+        self.assertEqual(len(registry.FILTERS), 10)
+    
+    def test_param_schema(self):
+        """Test that declared parameters match the filter signatures."""
+        spec = registry.FILTERS['solarize']
+        self.assertEqual(spec.param_names(), ['threshold'])
+        self.assertEqual(spec.params[0].type, int)
+        self.assertEqual(spec.params[0].default, 128)
+    
+    def test_bind_coerces_and_filters(self):
+        """Test that bind keeps only accepted arguments and coerces their types."""
+        self.assertEqual(registry.FILTERS['blur'].bind({'radius': '3', 'other': 1}), {'radius': 3.0})
+        self.assertEqual(registry.FILTERS['invert'].bind({'keep_mode': 'false'}), {'keep_mode': False})
+    
+    def test_cost_hints(self):
+        """Test the kernel radius and cost estimates."""
+        blur = registry.FILTERS['blur']
+        self.assertEqual(blur.kind, registry.CONVOLUTION)
+        self.assertEqual(blur.margin(radius=2.0), 6)
+        # Pillow's three box-blur passes each read at least one pixel
+        self.assertEqual(blur.margin(radius=0.4), 3)
+        self.assertEqual(registry.FILTERS['sharpen'].margin(), 1)
+        invert = registry.FILTERS['invert']
+        self.assertEqual(invert.kind, registry.POINTWISE)
+        self.assertEqual(invert.margin(), 0)
+        self.assertGreater(blur.estimate_cost_ns(100, 100), invert.estimate_cost_ns(100, 100))
+    
+    def test_register_rejects_unknown_param(self):
+        """Test that declaring a parameter the function lacks is an error."""
+        with self.assertRaises(TypeError):
+            @registry.register_filter('broken', params=[registry.FilterParam('missing', int, 0, '')])
+            def apply_broken(img: Image.Image) -> Image.Image:
+                return img
+        self.assertNotIn('broken', registry.FILTERS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from PIL import Image
+
+# Add the parent directory to the path so we can import the tools package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools import bulk_io, filters, registry, workers
+
+class TestWorkerPool(unittest.TestCase):
+    """Test cases for the persistent worker pool."""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Start one small pool shared by all tests."""
+        cls.pool = workers.WorkerPool(processes=2, max_tasks_per_child=2, health_check_interval=0)
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+    
+    def setUp(self):
+        """Create a gradient test image."""
+        self.test_image = Image.linear_gradient('L').resize((120, 80)).convert('RGB')
+    
+    def test_matches_inline(self):
+        """Test that filtering in a worker gives the same pixels as filtering inline."""
+        for name, params in [('blur', {'radius': 3.0}), ('sepia', {}), ('grayscale', {'keep_mode': True})]:
+            spec = registry.FILTERS[name]
+            result = self.pool.apply(spec, self.test_image, params)
+            expected = spec.func(self.test_image, **params)
+            self.assertEqual(result.mode, expected.mode)
+            self.assertEqual(result.tobytes(), expected.tobytes())
+    
+    def test_alpha_and_box(self):
+        """Test that RGBA images and regions of interest round-trip through shared memory."""
+        rgba = self.test_image.convert('RGBA')
+        rgba.putalpha(100)
+        result = self.pool.apply(registry.FILTERS['invert'], rgba, {}, box=[10, 10, 50, 50])
+        expected = filters.apply_to_boxes(rgba, filters.apply_invert, [10, 10, 50, 50])
+        self.assertEqual(result.tobytes(), expected.tobytes())
+    
+    def test_apply_tiled_matches_inline(self):
+        """Test that strips stitched back together match filtering the whole image."""
+        gray = self.test_image.convert('L')
+        noise = Image.effect_noise((120, 80), 64).convert('RGB')
+        for name, img, params in [('blur', self.test_image, {'radius': 3.0}),
+                                  ('blur', noise, {'radius': 0.2}), ('blur', noise, {'radius': 0.4}),
+                                  ('sharpen', self.test_image, {}),
+                                  ('edge_detection', gray, {}), ('sepia', gray, {})]:
+            spec = registry.FILTERS[name]
+            result = self.pool.apply_tiled(spec, img, params)
+            expected = spec.func(img, **params)
+            self.assertEqual(result.mode, expected.mode)
+            self.assertEqual(result.tobytes(), expected.tobytes())
+    
+    def test_batch_in_parallel(self):
+        """Test that a batch keeps several pool tasks in flight and writes every result."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i in range(5):
+                path = os.path.join(tmp_dir, f"image_{i}.png")
+                Image.new('RGB', (40, 30), color=(i * 50, 0, 0)).save(path)
+                paths.append(path)
+            spec = registry.FILTERS['invert']
+            results = bulk_io.process_files(
+                paths, lambda img: self.pool.submit(spec, img, {}),
+                lambda path: path.replace('.png', '_out.png'), max_in_flight=2)
+            for i, (path, output_path, error) in enumerate(results):
+                self.assertIsNone(error)
+                self.assertEqual(Image.open(output_path).getpixel((0, 0)), (255 - i * 50, 255, 255))
+    
+    def test_workers_recycled(self):
+        """Test that workers are replaced after max_tasks_per_child tasks."""
+        pids = {self.pool.pool.apply(workers._ping) for _ in range(8)}
+        self.assertGreater(len(pids), 2)
+    
+    def test_health_check(self):
+        """Test that a healthy pool passes its health check."""
+        self.assertTrue(self.pool.health_check())
+
+class TestWorkerPoolHealth(unittest.TestCase):
+    """Test cases for health checks and restarts on a single busy worker."""
+    
+    def setUp(self):
+        """Start a one-worker pool and a large image that takes a while to blur."""
+        self.pool = workers.WorkerPool(processes=1, health_check_interval=0, health_check_timeout=0.2)
+        self.large_image = Image.linear_gradient('L').resize((3000, 3000)).convert('RGB')
+        self.blur = registry.FILTERS['blur']
+    
+    def tearDown(self):
+        self.pool.close()
+    
+    def test_busy_worker_is_healthy(self):
+        """Test that a worker running a long filter is not mistaken for a hung one."""
+        future = self.pool.submit(self.blur, self.large_image, {'radius': 20.0})
+        self.assertTrue(self.pool.health_check())
+        self.assertEqual(future.result(30).size, (3000, 3000))
+    
+    def test_stuck_task_fails_health_check(self):
+        """Test that a task running past task_timeout triggers a restart."""
+        self.pool.task_timeout = 0.05
+        future = self.pool.submit(self.blur, self.large_image, {'radius': 20.0})
+        time.sleep(0.1)
+        self.assertFalse(self.pool.health_check())
+        with self.assertRaises(RuntimeError):
+            future.result(1)
+    
+    def test_restart_fails_pending_tasks(self):
+        """Test that restarting the pool fails in-flight tasks immediately."""
+        future = self.pool.submit(self.blur, self.large_image, {'radius': 20.0})
+        start = time.monotonic()
+        self.pool.restart()
+        with self.assertRaises(RuntimeError):
+            future.result(1)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(self.pool.apply(registry.FILTERS['invert'], self.large_image, {}).size, (3000, 3000))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from tools import filters
+
+def read_file(path: str) -> bytes:
+    """Read a whole file into memory."""
+    with open(path, "rb") as f:
+        return f.read()
+
+def decode(data: bytes) -> Image.Image:
+    """Decode an in-memory image file."""
+    img = Image.open(BytesIO(data))
+    img.load()
+    return img
+
+def save_atomic(img: Image.Image, path: str, **save_kwargs) -> str:
+    """Save img to path so readers never see a partially written file.
+
+    The image is written to a temporary file in the same directory and then
+    renamed over path, which is atomic on POSIX and Windows. Alpha is dropped
+    for formats such as JPEG that cannot store it.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    _, ext = os.path.splitext(name)
+    img = filters.drop_alpha_for(img, path, save_kwargs.get("format"))
+    # Keep the extension so Pillow picks the same format it would for path
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}{ext}")
+    try:
+        img.save(tmp_path, **save_kwargs)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+def read_ahead(paths, window: int = 4):
+    """Yield (path, future) pairs while the next `window` files are read in the background.
+
+    Each future resolves to the file's bytes, or raises the error hit while
+    reading it. At most `window` files are held in memory ahead of the consumer.
+    """
+    paths = iter(paths)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=window, thread_name_prefix="read-ahead") as pool:
+        def submit_next():
+            path = next(paths, None)
+            if path is not None:
+                pending.append((path, pool.submit(read_file, path)))
+
+        for _ in range(window):
+            submit_next()
+        while pending:
+            yield pending.popleft()
+            submit_next()
+
+class AtomicWriter:
+    """Thread pool that encodes and saves images with save_atomic.
+
+    At most `max_pending` writes are queued; submit blocks on the oldest
+    write beyond that so finished images do not pile up in memory.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="atomic-writer")
+        self.max_pending = max_pending or workers * 2
+        self.pending = deque()
+
+    def submit(self, img: Image.Image, path: str, **save_kwargs):
+        """Queue img to be saved to path, returning a future for the saved path."""
+        while len(self.pending) >= self.max_pending:
+            self.pending.popleft().exception()
+        future = self.pool.submit(save_atomic, img, path, **save_kwargs)
+        self.pending.append(future)
+        return future
+
+    def close(self):
+        """Wait for all queued writes to finish."""
+        self.pool.shutdown(wait=True)
+        self.pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def unique_path(path: str, taken) -> str:
+    """Return path, or path with a numeric suffix, so that it is not in taken."""
+    base, ext = os.path.splitext(path)
+    candidate, counter = path, 1
+    while candidate in taken:
+        candidate = f"{base}_{counter}{ext}"
+        counter += 1
+    return candidate
+
+def process_files(paths, func, output_path_for, window: int = 4, writers: int = 2, max_in_flight: int = 1):
+    """Apply func to every image in paths, overlapping reads and writes with compute.
+
+    Inputs are read ahead and decoded from memory, outputs go through an
+    AtomicWriter pool. output_path_for maps an input path to its output path;
+    if two inputs map to the same output, later ones get a numeric suffix.
+    func may return the filtered image or a Future for it (for example from
+    WorkerPool.submit); up to max_in_flight such Futures run at once so a
+    pool of workers shares the batch.
+    Returns a list of (input_path, output_path, error) tuples in input order,
+    with error set to None on success and output_path to None on failure.
+    """
+    results = []
+    futures = []
+    taken = set()
+    computing = deque()
+
+    def write_oldest():
+        path, result = computing.popleft()
+        try:
+            result_img = result.result() if isinstance(result, Future) else result
+            output_path = unique_path(os.path.abspath(output_path_for(path)), taken)
+        except Exception as e:
+            results.append((path, None, e))
+            return
+        taken.add(output_path)
+        futures.append((len(results), writer.submit(result_img, output_path)))
+        results.append((path, output_path, None))
+
+    with AtomicWriter(workers=writers) as writer:
+        for path, data in read_ahead(paths, window=max(window, max_in_flight)):
+            try:
+                computing.append((path, func(decode(data.result()))))
+            except Exception as e:
+                # Keep results in input order behind the images still computing
+                failed = Future()
+                failed.set_exception(e)
+                computing.append((path, failed))
+            while len(computing) >= max_in_flight:
+                write_oldest()
+        while computing:
+            write_oldest()
+    # Writes are finished once the writer is closed; record any that failed
+    for index, future in futures:
+        error = future.exception()
+        if error is not None:
+            results[index] = (results[index][0], None, error)
+    return results
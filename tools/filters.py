@@ -1,55 +1,210 @@
+import os
 from PIL import Image, ImageFilter, ImageOps
+from tools.registry import CONVOLUTION, FilterParam, gaussian_radius, register_filter
 
-def apply_grayscale(img: Image.Image) -> Image.Image:
-    """Convert image to grayscale."""
-    # Convert to grayscale then back to RGB (if consistency is needed)
-    return img.convert("L").convert("RGB")
+# Shared by the filters that would otherwise promote grayscale output to RGB
+KEEP_MODE = FilterParam("keep_mode", bool, False,
+                        "Return single-band output for grayscale results instead of converting to RGB")
 
+# Sepia tone as an RGB -> RGB colour matrix, so Pillow applies it in C
+SEPIA_MATRIX = (
+    0.393, 0.769, 0.189, 0,
+    0.349, 0.686, 0.168, 0,
+    0.272, 0.534, 0.131, 0,
+)
+
+def native_mode(img: Image.Image) -> Image.Image:
+    """Return img in one of the modes the filters work on natively (L, LA, RGB, RGBA)."""
+    if img.mode in ("L", "LA", "RGB", "RGBA"):
+        return img
+    if img.mode in ("1", "I", "F") or img.mode.startswith("I;"):
+        return img.convert("L")
+    if img.mode in ("PA", "La", "RGBa") or "transparency" in img.info:
+        return img.convert("RGBA")
+    return img.convert("RGB")
+
+def _map_color_bands(img: Image.Image, func) -> Image.Image:
+    """Apply func to the colour bands of img, leaving any alpha band untouched."""
+    img = native_mode(img)
+    if img.mode in ("L", "RGB"):
+        return func(img)
+    alpha = img.getchannel("A")
+    result = func(img.convert(img.mode[:-1]))
+    result.putalpha(alpha)
+    return result
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """Promote L/LA results to RGB/RGBA, leaving colour images as they are."""
+    if img.mode == "L":
+        return img.convert("RGB")
+    if img.mode == "LA":
+        return img.convert("RGBA")
+    return img
+
+def _sepia(img: Image.Image) -> Image.Image:
+    """Apply the sepia matrix to an L or RGB image."""
+    if img.mode == "RGB":
+        return img.convert("RGB", SEPIA_MATRIX)
+    # For grey input every row of the matrix collapses to a single gain per band
+    bands = []
+    for row in range(3):
+        gain = sum(SEPIA_MATRIX[row * 4:row * 4 + 3])
+        bands.append(img.point(lambda v, gain=gain: min(int(gain * v), 255)))
+    return Image.merge("RGB", bands)
+
+@register_filter("grayscale", params=[KEEP_MODE], ns_per_pixel=2.1)
+def apply_grayscale(img: Image.Image, keep_mode: bool = False) -> Image.Image:
+    """Convert image to grayscale.
+
+    The result is RGB (RGBA for images with alpha) unless keep_mode is set,
+    in which case the single-band L (or LA) image is returned as-is.
+    """
+    img = native_mode(img)
+    if img.mode in ("L", "LA"):
+        # Already grey: a single copy or conversion, never both
+        return img.copy() if keep_mode else _to_rgb(img)
+    gray = img.convert("LA" if img.mode == "RGBA" else "L")
+    return gray if keep_mode else _to_rgb(gray)
+
+@register_filter("sepia", ns_per_pixel=3.5)
 def apply_sepia(img: Image.Image) -> Image.Image:
     """Apply a sepia tone filter."""
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-    width, height = img.size
-    pixels = img.load()  # Get pixel data
-    for y in range(height):
-        for x in range(width):
-            r, g, b = pixels[x, y]
-            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-            pixels[x, y] = (min(tr, 255), min(tg, 255), min(tb, 255))
-    return img
+    return _map_color_bands(img, _sepia)
 
+@register_filter("blur", kind=CONVOLUTION, ns_per_pixel=42,
+                 params=[FilterParam("radius", float, 2.0, "Standard deviation of the Gaussian blur in pixels")],
+                 kernel_radius=gaussian_radius)
 def apply_blur(img: Image.Image, radius: float = 2.0) -> Image.Image:
     """Blur the image using a Gaussian filter."""
-    return img.filter(ImageFilter.GaussianBlur(radius))
+    return _map_color_bands(img, lambda color: color.filter(ImageFilter.GaussianBlur(radius)))
 
+@register_filter("sharpen", kind=CONVOLUTION, ns_per_pixel=20, kernel_radius=1)
 def apply_sharpen(img: Image.Image) -> Image.Image:
     """Sharpen the image to enhance details."""
-    return img.filter(ImageFilter.SHARPEN)
+    return _map_color_bands(img, lambda color: color.filter(ImageFilter.SHARPEN))
 
+@register_filter("edge_detection", kind=CONVOLUTION, ns_per_pixel=21, kernel_radius=1)
 def apply_edge_detection(img: Image.Image) -> Image.Image:
     """Detect edges in the image."""
-    return img.filter(ImageFilter.FIND_EDGES)
+    return _map_color_bands(img, lambda color: color.filter(ImageFilter.FIND_EDGES))
+
+@register_filter("invert", params=[KEEP_MODE], ns_per_pixel=1.3)
+def apply_invert(img: Image.Image, keep_mode: bool = False) -> Image.Image:
+    """Invert the colors of the image.
 
-def apply_invert(img: Image.Image) -> Image.Image:
-    """Invert the colors of the image."""
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-    return ImageOps.invert(img)
+    Grayscale input is promoted to RGB unless keep_mode is set.
+    """
+    result = _map_color_bands(img, ImageOps.invert)
+    return result if keep_mode else _to_rgb(result)
 
+@register_filter("emboss", kind=CONVOLUTION, ns_per_pixel=18, kernel_radius=1)
 def apply_emboss(img: Image.Image) -> Image.Image:
     """Apply an emboss filter to the image."""
-    return img.filter(ImageFilter.EMBOSS)
+    return _map_color_bands(img, lambda color: color.filter(ImageFilter.EMBOSS))
 
+@register_filter("contour", kind=CONVOLUTION, ns_per_pixel=19, kernel_radius=1)
 def apply_contour(img: Image.Image) -> Image.Image:
     """Apply a contour filter to the image."""
-    return img.filter(ImageFilter.CONTOUR)
+    return _map_color_bands(img, lambda color: color.filter(ImageFilter.CONTOUR))
 
+@register_filter("smooth", kind=CONVOLUTION, ns_per_pixel=19, kernel_radius=1)
 def apply_smooth(img: Image.Image) -> Image.Image:
     """Smooth the image."""
-    return img.filter(ImageFilter.SMOOTH)
+    return _map_color_bands(img, lambda color: color.filter(ImageFilter.SMOOTH))
 
+@register_filter("solarize", ns_per_pixel=1.4,
+                 params=[FilterParam("threshold", int, 128, "Pixels at or above this value (0-255) are inverted")])
 def apply_solarize(img: Image.Image, threshold: int = 128) -> Image.Image:
     """Apply a solarize effect to the image."""
-    return ImageOps.solarize(img, threshold)
+    return _map_color_bands(img, lambda color: ImageOps.solarize(color, threshold))
+
+# Formats Pillow can write but that have no alpha channel
+NO_ALPHA_FORMATS = {"JPEG", "PPM", "PCX", "EPS"}
+
+def drop_alpha_for(img: Image.Image, path: str, format: str = None) -> Image.Image:
+    """Drop the alpha band if the format chosen by path (or format) cannot store it."""
+    if img.mode not in ("LA", "RGBA"):
+        return img
+    if format is None:
+        format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+    if format and format.upper() in NO_ALPHA_FORMATS:
+        return img.convert(img.mode[:-1])
+    return img
+
+def normalize_boxes(boxes, size):
+    """Turn a single box or a list of boxes into clipped (left, top, right, bottom) tuples."""
+    if boxes and not isinstance(boxes[0], (list, tuple)):
+        boxes = [boxes]
+    width, height = size
+    normalized = []
+    for box in boxes:
+        if len(box) != 4:
+            raise ValueError(f"Box must be (left, top, right, bottom), got {box}")
+        left, top, right, bottom = (int(v) for v in box)
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+        if right <= left or bottom <= top:
+            raise ValueError(f"Box {box} does not overlap the {width}x{height} image")
+        normalized.append((left, top, right, bottom))
+    return normalized
+
+# Mode conversions that keep every pixel's appearance, so the area outside a
+# region of interest can be widened to match the filtered region
+LOSSLESS_PROMOTIONS = {("L", "LA"), ("L", "RGB"), ("L", "RGBA"), ("LA", "RGBA"), ("RGB", "RGBA")}
+
+def apply_to_boxes(img: Image.Image, func, boxes, margin: int = 0, **params) -> Image.Image:
+    """Apply func only inside boxes, leaving the rest of the image untouched.
+
+    Each box is cropped with `margin` extra pixels of context on every side so
+    convolution kernels see the same neighbourhood as on the full image, then
+    only the box itself is pasted back. Every region is filtered from the
+    original pixels, so overlapping boxes are never filtered twice.
+    """
+    img = native_mode(img)
+    boxes = normalize_boxes(boxes, img.size)
+    if not boxes:
+        return func(img, **params)
+    width, height = img.size
+    result = None
+    for left, top, right, bottom in boxes:
+        outer = (max(left - margin, 0), max(top - margin, 0),
+                 min(right + margin, width), min(bottom + margin, height))
+        region = func(img.crop(outer), **params)
+        if result is None:
+            # Widen the base only when no pixel outside the boxes changes;
+            # otherwise bring the region back to the input mode
+            if region.mode == img.mode:
+                result = img.copy()
+            elif (img.mode, region.mode) in LOSSLESS_PROMOTIONS:
+                result = img.convert(region.mode)
+            else:
+                result = img.copy()
+                region = region.convert(img.mode)
+        elif region.mode != result.mode:
+            region = region.convert(result.mode)
+        inner = (left - outer[0], top - outer[1], right - outer[0], bottom - outer[1])
+        result.paste(region.crop(inner), (left, top))
+    return result
+
+def convert_for(img: Image.Image, modes) -> Image.Image:
+    """Return img in one of modes, widening it losslessly where one allows it."""
+    img = native_mode(img)
+    if img.mode in modes:
+        return img
+    for mode in modes:
+        if (img.mode, mode) in LOSSLESS_PROMOTIONS:
+            return img.convert(mode)
+    return img.convert(modes[0])
+
+def apply_filter(spec, img: Image.Image, box=None, **params) -> Image.Image:
+    """Run a registered filter on img, or only inside box, in a mode it declares.
+
+    Each region is converted on its own, so a filter that only handles some
+    modes never changes the pixels outside the boxes.
+    """
+    def run(region, **params):
+        return spec.func(convert_for(region, spec.modes), **params)
+
+    if box:
+        return apply_to_boxes(img, run, box, spec.margin(**params), **params)
+    return run(img, **params)
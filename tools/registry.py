@@ -0,0 +1,119 @@
+import inspect
+import math
+import sys
+from dataclasses import dataclass, field
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+# Entry point group third-party packages use to contribute filters
+ENTRY_POINT_GROUP = "image_filter_mcp.filters"
+
+# Filter kinds: pointwise filters map each pixel independently, convolutions
+# read a neighbourhood of kernel_radius pixels around it
+POINTWISE = "pointwise"
+CONVOLUTION = "convolution"
+
+NATIVE_MODES = ("L", "LA", "RGB", "RGBA")
+
+@dataclass
+class FilterParam:
+    """A typed, documented parameter accepted by a filter."""
+    name: str
+    type: type
+    default: Any
+    description: str
+
+    def coerce(self, value):
+        """Convert a JSON-RPC argument to this parameter's type."""
+        if self.type is bool and isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return value if isinstance(value, self.type) else self.type(value)
+
+@dataclass
+class FilterSpec:
+    """A registered filter and the metadata used to schedule it."""
+    name: str
+    func: Callable
+    description: str = ""
+    kind: str = POINTWISE
+    params: List[FilterParam] = field(default_factory=list)
+    modes: Tuple[str, ...] = NATIVE_MODES
+    # Cost model: measured nanoseconds per RGB pixel on a single core, and
+    # the kernel radius (an int, or a function of the filter parameters)
+    ns_per_pixel: float = 1.0
+    kernel_radius: Union[int, Callable[..., int]] = 0
+
+    def param_names(self) -> List[str]:
+        """Return the names of the parameters this filter accepts."""
+        return [param.name for param in self.params]
+
+    def bind(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick out and coerce the arguments this filter accepts, ignoring the rest."""
+        return {param.name: param.coerce(kwargs[param.name])
+                for param in self.params if param.name in kwargs}
+
+    def margin(self, **params) -> int:
+        """Return the pixels of context needed around a region for these parameters."""
+        if callable(self.kernel_radius):
+            return self.kernel_radius(**params)
+        return self.kernel_radius
+
+    def estimate_cost_ns(self, width: int, height: int, **params) -> float:
+        """Estimate the time in nanoseconds to filter a width x height region."""
+        margin = self.margin(**params)
+        return self.ns_per_pixel * (width + 2 * margin) * (height + 2 * margin)
+
+# All known filters, in registration order
+FILTERS: Dict[str, FilterSpec] = {}
+
+def register_filter(name: str, kind: str = POINTWISE, params=(), modes=NATIVE_MODES,
+                    ns_per_pixel: float = 1.0, kernel_radius=0):
+    """Decorator registering a filter function under name."""
+    def decorator(func):
+        accepted = list(inspect.signature(func).parameters)[1:]
+        for param in params:
+            if param.name not in accepted:
+                raise TypeError(f"Filter {name} declares parameter {param.name!r} "
+                                f"that {func.__name__} does not accept")
+        doc = inspect.getdoc(func) or ""
+        FILTERS[name] = FilterSpec(
+            name=name,
+            func=func,
+            description=doc.splitlines()[0] if doc else "",
+            kind=kind,
+            params=list(params),
+            modes=tuple(modes),
+            ns_per_pixel=ns_per_pixel,
+            kernel_radius=kernel_radius,
+        )
+        return func
+    return decorator
+
+def gaussian_radius(radius: float = 2.0, **_) -> int:
+    """Pixels of context read by Pillow's GaussianBlur for the given radius.
+
+    Pillow approximates the Gaussian with three box blurs; this mirrors its
+    box radius calculation. Each pass reads the whole part of that radius
+    plus one partially weighted pixel, so even tiny radii need 3 pixels.
+    """
+    passes = 3
+    sigma2 = radius * radius / passes
+    whole = math.floor((math.sqrt(12 * sigma2 + 1) - 1) / 2)
+    box_radius = whole + ((2 * whole + 1) * (whole * (whole + 1) - 3 * sigma2)
+                          / (6 * (sigma2 - (whole + 1) ** 2)))
+    return passes * (int(box_radius) + 1)
+
+def load_entry_points(group: str = ENTRY_POINT_GROUP):
+    """Import filters contributed by installed packages.
+
+    An entry point may name a module whose filters register themselves on
+    import, or a FilterSpec object. Broken plugins are reported and skipped.
+    """
+    for entry_point in entry_points(group=group):
+        try:
+            obj = entry_point.load()
+        except Exception as e:
+            print(f"Could not load filter plugin {entry_point.name}: {e}", file=sys.stderr)
+            continue
+        if isinstance(obj, FilterSpec):
+            FILTERS[obj.name] = obj
@@ -0,0 +1,234 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import resource_tracker, shared_memory
+from PIL import Image
+from tools import filters, registry
+
+def _warm_worker():
+    """Pool initializer: load every Pillow codec and filter plugin once per worker."""
+    Image.init()
+    registry.load_entry_points()
+
+def _ping():
+    """Trivial task used to check that a worker is responsive."""
+    return os.getpid()
+
+def _run_shared(op_name, params, box, mode, size, in_name, out_name):
+    """Filter the image in shared memory in_name and write the result to out_name.
+
+    Returns the (mode, size) of the result; the pixels travel through shared
+    memory rather than being pickled.
+    """
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        img = Image.frombuffer(mode, size, in_shm.buf, "raw", mode, 0, 1)
+        result = filters.apply_filter(registry.FILTERS[op_name], img, box, **params)
+        # Drop the view onto the input buffer before the segment is closed
+        del img
+        data = result.tobytes()
+        out_shm.buf[:len(data)] = data
+        return result.mode, result.size
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+def _context():
+    """Multiprocessing context for the workers.
+
+    Recycled workers are started while the server has reader and writer
+    threads running, and a plain fork could copy a lock one of them holds into
+    the child and hang it. A forkserver with Pillow and the filters preloaded
+    forks from a clean, already warm process instead.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["__main__", "PIL.Image", "tools.filters"])
+    return context
+
+class _Task:
+    """A filter call in flight in the pool, with the shared memory it owns."""
+
+    def __init__(self, in_shm, out_shm):
+        self.in_shm = in_shm
+        self.out_shm = out_shm
+        self.future = Future()
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.settled = False
+
+    def finish(self, outcome):
+        """Resolve the future from a worker result or an exception, exactly once."""
+        with self.lock:
+            if self.settled:
+                return
+            self.settled = True
+        try:
+            if isinstance(outcome, BaseException):
+                self.future.set_exception(outcome)
+                return
+            mode, size = outcome
+            view = self.out_shm.buf[:size[0] * size[1] * Image.getmodebands(mode)]
+            try:
+                self.future.set_result(Image.frombytes(mode, size, view))
+            finally:
+                view.release()
+        except Exception as e:
+            self.future.set_exception(e)
+        finally:
+            for shm in (self.in_shm, self.out_shm):
+                shm.close()
+                shm.unlink()
+
+class WorkerPool:
+    """Persistent pool of warm worker processes for CPU-heavy filtering.
+
+    Workers preload Pillow's codecs and the filter registry when they start,
+    receive images through shared memory, and are replaced after
+    max_tasks_per_child tasks to bound memory fragmentation. A background
+    thread checks the pool every health_check_interval seconds and restarts it
+    if a task has run longer than task_timeout or an idle worker stops
+    answering pings.
+    """
+
+    def __init__(self, processes: int = None, max_tasks_per_child: int = 100, task_timeout: float = 120.0,
+                 health_check_interval: float = 30.0, health_check_timeout: float = 5.0):
+        self.processes = processes or os.cpu_count() or 1
+        self.max_tasks_per_child = max_tasks_per_child
+        self.task_timeout = task_timeout
+        self.health_check_timeout = health_check_timeout
+        # Guards pool and in_flight. Never held while waiting on workers: the
+        # pool's result thread takes it when a task finishes.
+        self.lock = threading.Lock()
+        self.in_flight = set()
+        # Start the resource tracker first so forked workers share it with us
+        resource_tracker.ensure_running()
+        self.pool = self._start_pool()
+        self.stopped = threading.Event()
+        self.monitor = None
+        if health_check_interval:
+            self.monitor = threading.Thread(target=self._monitor, args=(health_check_interval,),
+                                            name="worker-health-check", daemon=True)
+            self.monitor.start()
+
+    def _start_pool(self):
+        return _context().Pool(self.processes, initializer=_warm_worker,
+                               maxtasksperchild=self.max_tasks_per_child)
+
+    def _forget(self, task):
+        with self.lock:
+            self.in_flight.discard(task)
+
+    def restart(self):
+        """Replace every worker with a fresh one, failing the tasks that were in flight."""
+        print("Restarting filter worker pool", file=sys.stderr)
+        with self.lock:
+            old_pool, self.pool = self.pool, self._start_pool()
+            pending, self.in_flight = self.in_flight, set()
+        for task in pending:
+            task.finish(RuntimeError("Filter worker pool was restarted while the task was running"))
+        old_pool.terminate()
+        old_pool.join()
+
+    def health_check(self) -> bool:
+        """Return True if the pool is healthy, restarting it if not.
+
+        A task running longer than task_timeout means its worker is hung or
+        died. Workers that are not running a task must answer a ping within
+        health_check_timeout; busy workers are not pinged, so long filters
+        are not mistaken for hangs.
+        """
+        now = time.monotonic()
+        with self.lock:
+            stuck = sum(1 for task in self.in_flight if now - task.started > self.task_timeout)
+            idle = max(self.processes - len(self.in_flight), 0)
+            pings = [self.pool.apply_async(_ping) for _ in range(idle)] if not stuck else []
+        try:
+            if stuck:
+                raise multiprocessing.TimeoutError(f"{stuck} task(s) running longer than {self.task_timeout}s")
+            for ping in pings:
+                ping.get(self.health_check_timeout)
+            return True
+        except Exception as e:
+            print(f"Filter worker health check failed: {e!r}", file=sys.stderr)
+            self.restart()
+            return False
+
+    def _monitor(self, interval):
+        while not self.stopped.wait(interval):
+            self.health_check()
+
+    def submit(self, spec, img: Image.Image, params: dict, box=None) -> Future:
+        """Start a registered filter on img in a worker process.
+
+        Returns a Future for the filtered image. It fails immediately if the
+        pool is restarted while the task is running.
+        """
+        img = filters.native_mode(img)
+        data = img.tobytes()
+        in_shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        # Filters keep the image size and produce at most four 8-bit bands
+        out_shm = shared_memory.SharedMemory(create=True, size=img.width * img.height * 4 or 1)
+        in_shm.buf[:len(data)] = data
+        del data
+        task = _Task(in_shm, out_shm)
+        task.future.add_done_callback(lambda _: self._forget(task))
+        try:
+            with self.lock:
+                self.in_flight.add(task)
+                self.pool.apply_async(_run_shared, (spec.name, params, box, img.mode, img.size,
+                                                    in_shm.name, out_shm.name),
+                                      callback=task.finish, error_callback=task.finish)
+        except Exception as e:
+            # Settle outside the lock, since the future's done callback takes it
+            task.finish(e)
+        return task.future
+
+    def result(self, future: Future) -> Image.Image:
+        """Wait for a submitted task, restarting the pool if it exceeds task_timeout."""
+        try:
+            return future.result(self.task_timeout)
+        except FutureTimeoutError:
+            self.restart()
+            raise
+
+    def apply(self, spec, img: Image.Image, params: dict, box=None) -> Image.Image:
+        """Run a registered filter on img in a worker process and return the result."""
+        return self.result(self.submit(spec, img, params, box))
+
+    def apply_tiled(self, spec, img: Image.Image, params: dict) -> Image.Image:
+        """Filter img in horizontal strips spread across all the workers.
+
+        Each strip carries the filter's kernel margin of extra rows, so the
+        stitched result matches filtering the whole image in one go.
+        """
+        img = filters.native_mode(img)
+        width, height = img.size
+        margin = spec.margin(**params)
+        rows = -(-height // self.processes)
+        strips = []
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            outer_top, outer_bottom = max(top - margin, 0), min(bottom + margin, height)
+            crop = img.crop((0, outer_top, width, outer_bottom))
+            strips.append((top, top - outer_top, bottom - top, self.submit(spec, crop, params)))
+        result = None
+        for top, offset, strip_rows, future in strips:
+            region = self.result(future)
+            if result is None:
+                result = Image.new(region.mode, img.size)
+            result.paste(region.crop((0, offset, width, offset + strip_rows)), (0, top))
+        return result
+
+    def close(self):
+        """Stop the health checks and shut down the workers."""
+        self.stopped.set()
+        with self.lock:
+            pool = self.pool
+        pool.close()
+        pool.join()